@@ -1,16 +1,45 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional
+from dataclasses import dataclass
+from collections import OrderedDict
 import os
 import math
+import time
+import asyncio
+import logging
+import numpy as np
+import orjson
 import openai
-from supabase import create_client, Client
+from contextlib import asynccontextmanager
+from supabase._async.client import create_client as create_async_client
 from dotenv import load_dotenv
 
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:  # Fall back to the vectorized NumPy scan
+    BallTree = None
+
 load_dotenv()
 
-app = FastAPI(title="UMass Restroom Locator API", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize the async Supabase client so queries don't block the event loop
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_ANON_KEY")
+    app.state.supabase = await create_async_client(supabase_url, supabase_key)
+    yield
+
+app = FastAPI(
+    title="UMass Restroom Locator API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # CORS middleware to allow React frontend
 app.add_middleware(
@@ -21,11 +50,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_ANON_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
-
 # Initialize OpenAI
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
@@ -75,14 +99,233 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     a = (math.sin(delta_lat / 2) * math.sin(delta_lat / 2) +
          math.cos(lat1_rad) * math.cos(lat2_rad) *
          math.sin(delta_lon / 2) * math.sin(delta_lon / 2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    c = 2.0 * math.asin(min(1.0, math.sqrt(a)))  # Clamp guards against rounding just past 1
     
     return R * c
 
+RESTROOM_COLUMNS = (
+    "id, building_name, floor_or_area, formatted_address_google, address, "
+    "latitude_google, longitude_google, rooms, restroom_type, multi_user_stalls, "
+    "has_shower, staff_only_any, notes, google_maps_url, google_directions_url"
+)
+METERS_PER_MILE = 1609.34
+# PostgREST / Postgres error codes for a missing function
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+RESTROOM_CACHE_TTL_SECONDS = 600  # The dataset is effectively static; refresh every 10 minutes
+RESTROOM_REFRESH_RETRY_SECONDS = 60
+
+@dataclass
+class _RestroomCache:
+    rows: list
+    lats: np.ndarray  # radians
+    lons: np.ndarray  # radians
+    loaded_at: float
+    columns: dict  # One array per static RestroomInfo field, parallel to rows
+    tree: Optional["BallTree"] = None  # Built over rows with coordinates when sklearn is available
+    tree_index: Optional[np.ndarray] = None  # Maps tree points back to positions in rows
+    id_index: Optional[dict] = None  # Maps restroom id to its position in rows
+    rpc_available: bool = True  # Cleared when restrooms_within is not deployed; retried on the next refresh
+
+# Typed columns; every other RestroomInfo field is stored as an object array
+RESTROOM_COLUMN_DTYPES = {
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'has_shower': np.bool_,
+    'staff_only_any': np.bool_,
+}
+
+_restroom_cache: Optional[_RestroomCache] = None
+_restroom_cache_lock = asyncio.Lock()
+_restroom_refresh_retry_at = 0.0  # After a failed refresh, the stale cache is served until this time
+
+def _prebuild_restroom(restroom: dict) -> dict:
+    """Coerce a fetched row into the static RestroomInfo fields once, at cache-load time."""
+    latitude = restroom['latitude_google']
+    longitude = restroom['longitude_google']
+    return {
+        'id': str(restroom.get('id', restroom['building_name'])),
+        'building_name': restroom['building_name'],
+        'floor_or_area': restroom.get('floor_or_area'),
+        'address': restroom['formatted_address_google'] or restroom.get('address') or '',
+        'latitude': float(latitude) if latitude else None,
+        'longitude': float(longitude) if longitude else None,
+        'rooms': restroom.get('rooms', ''),
+        'restroom_type': restroom.get('restroom_type') or 'restroom',
+        'multi_user_stalls': restroom.get('multi_user_stalls'),
+        'has_shower': bool(restroom.get('has_shower', False)),
+        'staff_only_any': bool(restroom.get('staff_only_any', False)),
+        'notes': restroom.get('notes'),
+        'google_maps_url': restroom.get('google_maps_url') or '',
+        'google_directions_url': restroom.get('google_directions_url') or '',
+    }
+
+def _build_restroom_cache(rows: list) -> _RestroomCache:
+    """Decode fetched rows into parallel column arrays (missing coordinates become NaN)."""
+    # Store the coerced fields column-wise; natural summaries only read static columns
+    prebuilt = [_prebuild_restroom(r) for r in rows]
+    columns = {
+        field: np.asarray([p[field] for p in prebuilt], dtype=RESTROOM_COLUMN_DTYPES.get(field, object))
+        for field in RestroomInfo.model_fields
+        if field not in ('distance_miles', 'eta_minutes', 'natural_summary')
+    }
+    columns['natural_summary'] = np.asarray([generate_natural_summary(r) for r in rows], dtype=object)
+
+    cache = _RestroomCache(
+        rows=rows,
+        lats=np.radians(columns['latitude']),
+        lons=np.radians(columns['longitude']),
+        loaded_at=time.monotonic(),
+        columns=columns,
+        id_index={restroom_id: i for i, restroom_id in enumerate(columns['id'].tolist())},
+    )
+
+    if BallTree is not None:
+        valid = np.where(np.isfinite(cache.lats) & np.isfinite(cache.lons))[0]
+        if valid.size:
+            cache.tree = BallTree(np.c_[cache.lats[valid], cache.lons[valid]], metric='haversine')
+            cache.tree_index = valid
+    return cache
+
+def _is_fresh(cache: Optional[_RestroomCache], ttl: float) -> bool:
+    now = time.monotonic()
+    return cache is not None and (now - cache.loaded_at < ttl or now < _restroom_refresh_retry_at)
+
+async def _get_restrooms(ttl: float = RESTROOM_CACHE_TTL_SECONDS) -> _RestroomCache:
+    """Return the cached campus restroom table, re-querying Supabase once it is older than ttl seconds."""
+    global _restroom_cache, _restroom_refresh_retry_at
+    cache = _restroom_cache
+    if _is_fresh(cache, ttl):
+        return cache
+
+    async with _restroom_cache_lock:
+        # Another request may have refreshed the cache while we waited for the lock
+        cache = _restroom_cache
+        if _is_fresh(cache, ttl):
+            return cache
+
+        try:
+            response = await app.state.supabase.table("restrooms").select(
+                RESTROOM_COLUMNS
+            ).eq("within_campus_bbox", True).execute()
+        except Exception as e:
+            if cache is None:
+                raise
+            # Keep serving the stale table and back off instead of retrying on every request
+            logger.warning("Restroom cache refresh failed, serving stale data: %s", e)
+            _restroom_refresh_retry_at = time.monotonic() + RESTROOM_REFRESH_RETRY_SECONDS
+            return cache
+
+        _restroom_cache = _build_restroom_cache(response.data or [])
+        return _restroom_cache
+
+RESPONSE_CACHE_SIZE = 512
+
+# Serialized endpoint responses keyed by (endpoint, quantized location); only valid for one restroom cache load
+_response_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_response_cache_loaded_at: Optional[float] = None
+
+def _response_cache_key(endpoint: str, location: LocationRequest) -> tuple:
+    """Quantize the request to ~10 m cells so nearby users share a cache entry."""
+    return (endpoint, round(location.latitude, 4), round(location.longitude, 4), round(location.radius_miles, 2))
+
+def _get_cached_response(cache: _RestroomCache, key: tuple) -> Optional[Response]:
+    """Return the cached response for key, dropping all entries if the restroom cache was refreshed."""
+    global _response_cache_loaded_at
+    if _response_cache_loaded_at != cache.loaded_at:
+        _response_cache.clear()
+        _response_cache_loaded_at = cache.loaded_at
+
+    body = _response_cache.get(key)
+    if body is None:
+        return None
+    _response_cache.move_to_end(key)
+    return Response(content=body, media_type="application/json")
+
+def _store_response(cache: _RestroomCache, key: tuple, location_groups: list, cacheable: bool = True) -> Response:
+    """Serialize location groups once, remember the bytes (LRU eviction) and return them as a response."""
+    body = orjson.dumps([group.model_dump() for group in location_groups])
+    # Don't file a body built from an older table under a newer generation (refresh during an await)
+    if not cacheable or _response_cache_loaded_at != cache.loaded_at:
+        return Response(content=body, media_type="application/json")
+
+    _response_cache[key] = body
+    _response_cache.move_to_end(key)
+    if len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+    return Response(content=body, media_type="application/json")
+
+def _gather_restrooms(cache: _RestroomCache, top: np.ndarray) -> list:
+    """Gather the selected rows from the column arrays as RestroomInfo kwargs (native Python values)."""
+    gathered = {field: column[top].tolist() for field, column in cache.columns.items()}
+    return [dict(zip(gathered, values)) for values in zip(*gathered.values())]
+
+async def nearest_restrooms(cache: _RestroomCache, latitude: float, longitude: float,
+                            radius_miles: float, limit: int) -> tuple:
+    """Return (row indices, distances) within radius, closest first, using the PostGIS restrooms_within RPC."""
+    if not cache.rpc_available:
+        return _nearest_restrooms_local(cache, latitude, longitude, radius_miles, limit)
+
+    try:
+        response = await app.state.supabase.rpc("restrooms_within", {
+            "lat": latitude,
+            "lng": longitude,
+            "radius_m": radius_miles * METERS_PER_MILE,
+            "max_results": limit,
+        }).execute()
+    except Exception as e:
+        if getattr(e, 'code', None) in MISSING_FUNCTION_CODES:
+            cache.rpc_available = False
+            logger.warning("restrooms_within RPC is not deployed; searching locally until the next cache refresh")
+        else:
+            logger.warning("restrooms_within RPC failed, searching locally: %s", e)
+        return _nearest_restrooms_local(cache, latitude, longitude, radius_miles, limit)
+
+    # Ids unknown to the cache (e.g. the table was repopulated since the last refresh)
+    # mean the RPC and the cache disagree; answer from the cache alone until it refreshes
+    rows = response.data or []
+    if any(str(r['id']) not in cache.id_index for r in rows):
+        logger.warning("restrooms_within returned ids missing from the restroom cache, searching locally")
+        return _nearest_restrooms_local(cache, latitude, longitude, radius_miles, limit)
+
+    matches = [(cache.id_index[str(r['id'])], r['distance_m'] / METERS_PER_MILE) for r in rows]
+    top = np.asarray([i for i, _ in matches], dtype=np.intp)
+    distances = np.asarray([d for _, d in matches], dtype=np.float64)
+    return top, distances
+
+def _nearest_restrooms_local(cache: _RestroomCache, latitude: float, longitude: float,
+                             radius_miles: float, limit: int) -> tuple:
+    """In-process fallback for nearest_restrooms using a BallTree or vectorized Haversine."""
+    R = 3959  # Earth's radius in miles
+
+    if cache.tree is not None:
+        q = np.radians([[latitude, longitude]])
+        idx, dist = cache.tree.query_radius(q, r=radius_miles / R, return_distance=True, sort_results=True)
+        return cache.tree_index[idx[0][:limit]], dist[0][:limit] * R
+
+    lat0 = math.radians(latitude)
+    lon0 = math.radians(longitude)
+
+    dlat = cache.lats - lat0
+    dlon = cache.lons - lon0
+    a = np.sin(dlat * 0.5) ** 2 + math.cos(lat0) * np.cos(cache.lats) * np.sin(dlon * 0.5) ** 2
+    distances = 2 * R * np.arcsin(np.sqrt(a))
+
+    # NaN distances (missing coordinates) never satisfy the radius check
+    # Partial selection of the closest `limit` candidates, then sort only those
+    idx = np.where(distances <= radius_miles)[0]
+    if idx.size > limit:
+        idx = idx[np.argpartition(distances[idx], limit)[:limit]]
+    top = idx[np.argsort(distances[idx], kind="stable")]
+    return top, distances[top]
+
 def calculate_walking_eta(distance_miles: float) -> int:
     """Calculate walking ETA in minutes (assuming 3 mph walking speed)."""
-    walking_speed_mph = 3.0
-    return max(1, int((distance_miles / walking_speed_mph) * 60))
+    # (distance / 3 mph) * 60 min, folded into a single multiply
+    return max(1, int(distance_miles * 20.0))
+
+def calculate_walking_etas(distances_miles: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_walking_eta over an array of distances."""
+    return np.maximum(1, (distances_miles * 20.0).astype(np.int32))
 
 def generate_natural_summary(restroom_data: dict) -> str:
     """Generate a simple, fast natural language summary without AI."""
@@ -131,66 +374,43 @@ async def root():
 async def search_restrooms(location: LocationRequest):
     """Search for nearby restrooms based on user location."""
     try:
-        # Query only necessary columns and filter by campus bbox for better performance
-        response = supabase.table("restrooms").select(
-            "id, building_name, floor_or_area, formatted_address_google, address, "
-            "latitude_google, longitude_google, rooms, restroom_type, multi_user_stalls, "
-            "has_shower, staff_only_any, notes, google_maps_url, google_directions_url"
-        ).eq("within_campus_bbox", True).execute()
+        # Campus restrooms are served from the in-process cache
+        restrooms = await _get_restrooms()
         
-        if not response.data:
+        if not restrooms.rows:
             raise HTTPException(status_code=404, detail="No restrooms found in database")
         
-        # Pre-filter and calculate distances
-        candidate_restrooms = []
-        for restroom in response.data:
-            if restroom['latitude_google'] and restroom['longitude_google']:
-                distance = calculate_distance(
-                    location.latitude, location.longitude,
-                    float(restroom['latitude_google']), float(restroom['longitude_google'])
-                )
-                
-                if distance <= location.radius_miles:
-                    candidate_restrooms.append((restroom, distance))
+        # Nearby repeat requests are served straight from the response cache
+        cache_key = _response_cache_key("search-restrooms", location)
+        cached_response = _get_cached_response(restrooms, cache_key)
+        if cached_response is not None:
+            return cached_response
         
-        if not candidate_restrooms:
-            raise HTTPException(status_code=404, detail="No restrooms found within the specified radius")
+        # Filter by radius and keep the 20 closest for performance
+        top, distances = await nearest_restrooms(
+            restrooms, location.latitude, location.longitude, location.radius_miles, 20
+        )
         
-        # Sort by distance and limit early
-        candidate_restrooms.sort(key=lambda x: x[1])
-        candidate_restrooms = candidate_restrooms[:20] if len(candidate_restrooms) > 20 else candidate_restrooms # Limit to 20 closest for performance
+        if not top.size:
+            raise HTTPException(status_code=404, detail="No restrooms found within the specified radius")
         
-        # Generate summaries and build response
+        # Build response from the precomputed columns and summaries
         restrooms_with_distance = []
-        for restroom, distance in candidate_restrooms:
-            eta = calculate_walking_eta(distance)
-            natural_summary = generate_natural_summary(restroom)
-            
-            restroom_info = RestroomInfo(
-                id=str(restroom.get('id', restroom['building_name'])),
-                building_name=restroom['building_name'],
-                floor_or_area=restroom.get('floor_or_area'),
-                address=restroom['formatted_address_google'] or restroom.get('address', ''),
-                latitude=float(restroom['latitude_google']),
-                longitude=float(restroom['longitude_google']),
-                rooms=restroom.get('rooms', ''),
-                restroom_type=restroom.get('restroom_type', 'restroom'),
-                multi_user_stalls=restroom.get('multi_user_stalls'),
-                has_shower=bool(restroom.get('has_shower', False)),
-                staff_only_any=bool(restroom.get('staff_only_any', False)),
-                notes=restroom.get('notes'),
-                google_maps_url=restroom.get('google_maps_url', ''),
-                google_directions_url=restroom.get('google_directions_url', ''),
+        etas = calculate_walking_etas(distances)
+        for fields, distance, eta in zip(_gather_restrooms(restrooms, top), distances.tolist(), etas.tolist()):
+            restroom_info = RestroomInfo.model_construct(
+                **fields,
                 distance_miles=round(distance, 2),
-                eta_minutes=eta,
-                natural_summary=natural_summary
+                eta_minutes=eta
             )
             restrooms_with_distance.append(restroom_info)
         
         # Group restrooms by building
-        building_groups = []
+        building_groups: dict = {}
         for restroom in restrooms_with_distance:
-                building_group = {
+            building_key = (restroom.building_name, restroom.address)
+            if building_key not in building_groups:
+                building_groups[building_key] = {
                     'building_name': restroom.building_name,
                     'address': restroom.address,
                     'latitude': restroom.latitude,
@@ -200,25 +420,27 @@ async def search_restrooms(location: LocationRequest):
                     'google_maps_url': restroom.google_maps_url,
                     'restrooms': []
                 }
-                building_group['restrooms'].append(restroom)
-                building_groups.append(building_group)
+            building_groups[building_key]['restrooms'].append(restroom)
         
-        # Convert to list (already sorted by distance)
+        # Convert to list (already sorted by distance) and return top 10 closest locations
         location_groups = [
-            LocationGroup(**group_data)
-            for group_data in building_groups
+            LocationGroup.model_construct(**group_data)
+            for group_data in list(building_groups.values())[:10]
         ]
         
-        return location_groups[:10] if len(location_groups) > 10 else location_groups # Return top 10 closest locations
+        return _store_response(restrooms, cache_key, location_groups)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching restrooms: {str(e)}")
 
-async def generate_ai_summary_batch(restrooms_data: list) -> list:
-    """Generate AI summaries for multiple restrooms in one call for better performance."""
+async def generate_ai_summary_batch(restrooms_data: list) -> tuple:
+    """Generate AI summaries for multiple restrooms in one call for better performance.
+
+    Returns (summaries, used_ai); used_ai is False when the local fallback was used.
+    """
     try:
         if not restrooms_data:
-            return []
+            return [], True
             
         # Create a batch prompt for multiple restrooms
         prompt = "Generate brief, friendly descriptions for these restroom locations (1 sentence each):\n\n"
@@ -235,7 +457,7 @@ async def generate_ai_summary_batch(restrooms_data: list) -> list:
         
         prompt += "\nFormat: Just return numbered descriptions, one per line."
         
-        response = openai.ChatCompletion.create(
+        response = await openai.ChatCompletion.acreate(
             model="gpt-4o-mini",  # Faster and cheaper model
             messages=[{"role": "user", "content": prompt}],
             max_tokens=len(restrooms_data) * 30,  # Scale with number of restrooms
@@ -256,77 +478,60 @@ async def generate_ai_summary_batch(restrooms_data: list) -> list:
         while len(clean_summaries) < len(restrooms_data):
             clean_summaries.append("Clean restroom facilities available.")
             
-        return clean_summaries[:len(restrooms_data)]
+        return clean_summaries[:len(restrooms_data)], True
         
     except Exception as e:
         print(f"AI summary generation failed: {e}")
         # Fallback to fast generation
-        return [generate_natural_summary(restroom) for restroom in restrooms_data]
+        return [generate_natural_summary(restroom) for restroom in restrooms_data], False
 
 @app.post("/search-restrooms-ai", response_model=List[LocationGroup])
 async def search_restrooms_with_ai(location: LocationRequest):
     """Search for nearby restrooms with AI-generated descriptions (slower but richer)."""
     try:
         # Use the same search logic but with AI summaries
-        response = supabase.table("restrooms").select(
-            "id, building_name, floor_or_area, formatted_address_google, address, "
-            "latitude_google, longitude_google, rooms, restroom_type, multi_user_stalls, "
-            "has_shower, staff_only_any, notes, google_maps_url, google_directions_url"
-        ).eq("within_campus_bbox", True).execute()
+        restrooms = await _get_restrooms()
         
-        if not response.data:
+        if not restrooms.rows:
             raise HTTPException(status_code=404, detail="No restrooms found in database")
         
-        # Pre-filter and calculate distances
-        candidate_restrooms = []
-        for restroom in response.data:
-            if restroom['latitude_google'] and restroom['longitude_google']:
-                distance = calculate_distance(
-                    location.latitude, location.longitude,
-                    float(restroom['latitude_google']), float(restroom['longitude_google'])
-                )
-                
-                if distance <= location.radius_miles:
-                    candidate_restrooms.append((restroom, distance))
+        # Nearby repeat requests are served straight from the response cache
+        cache_key = _response_cache_key("search-restrooms-ai", location)
+        cached_response = _get_cached_response(restrooms, cache_key)
+        if cached_response is not None:
+            return cached_response
         
-        if not candidate_restrooms:
-            return []
+        # Filter by radius and limit for AI processing
+        top, distances = await nearest_restrooms(
+            restrooms, location.latitude, location.longitude, location.radius_miles, 15
+        )
         
-        # Sort by distance and limit
-        candidate_restrooms.sort(key=lambda x: x[1])
-        candidate_restrooms = candidate_restrooms[:15]  # Limit for AI processing
+        if not top.size:
+            return _store_response(restrooms, cache_key, [])
         
-        # Generate AI summaries in batch
-        restroom_data_for_ai = [restroom for restroom, _ in candidate_restrooms]
-        ai_summaries = await generate_ai_summary_batch(restroom_data_for_ai)
+        # Start AI summaries in batch while the response models are built
+        restroom_data_for_ai = [restrooms.rows[i] for i in top]
+        ai_task = asyncio.create_task(generate_ai_summary_batch(restroom_data_for_ai))
+        await asyncio.sleep(0)  # Yield once so the task sends the OpenAI request before we build models
         
-        # Build response with AI summaries
+        # Build response with fast local summaries as placeholders
         restrooms_with_distance = []
-        for i, (restroom, distance) in enumerate(candidate_restrooms):
-            eta = calculate_walking_eta(distance)
-            natural_summary = ai_summaries[i] if i < len(ai_summaries) else generate_natural_summary(restroom)
-            
-            restroom_info = RestroomInfo(
-                id=str(restroom.get('id', restroom['building_name'])),
-                building_name=restroom['building_name'],
-                floor_or_area=restroom.get('floor_or_area'),
-                address=restroom['formatted_address_google'] or restroom.get('address', ''),
-                latitude=float(restroom['latitude_google']),
-                longitude=float(restroom['longitude_google']),
-                rooms=restroom.get('rooms', ''),
-                restroom_type=restroom.get('restroom_type', 'restroom'),
-                multi_user_stalls=restroom.get('multi_user_stalls'),
-                has_shower=bool(restroom.get('has_shower', False)),
-                staff_only_any=bool(restroom.get('staff_only_any', False)),
-                notes=restroom.get('notes'),
-                google_maps_url=restroom.get('google_maps_url', ''),
-                google_directions_url=restroom.get('google_directions_url', ''),
+        etas = calculate_walking_etas(distances)
+        for fields, distance, eta in zip(_gather_restrooms(restrooms, top), distances.tolist(), etas.tolist()):
+            restroom_info = RestroomInfo.model_construct(
+                **fields,
                 distance_miles=round(distance, 2),
-                eta_minutes=eta,
-                natural_summary=natural_summary
+                eta_minutes=eta
             )
             restrooms_with_distance.append(restroom_info)
         
+        # Patch in AI summaries once they arrive
+        ai_summaries, used_ai = await ai_task
+        restrooms_with_distance = [
+            restroom_info.model_copy(update={'natural_summary': ai_summaries[i]}) if i < len(ai_summaries) else restroom_info
+            for i, restroom_info in enumerate(restrooms_with_distance)
+        ]
+        
         # Group restrooms by building
         building_groups = {}
         for restroom in restrooms_with_distance:
@@ -344,13 +549,14 @@ async def search_restrooms_with_ai(location: LocationRequest):
                 }
             building_groups[building_key]['restrooms'].append(restroom)
         
-        # Convert to list
+        # Convert to list; inputs are server-built, so skip validation
         location_groups = [
-            LocationGroup(**group_data)
-            for group_data in building_groups.values()
+            LocationGroup.model_construct(**group_data)
+            for group_data in list(building_groups.values())[:10]
         ]
         
-        return location_groups[:10]
+        # Template fallbacks after an OpenAI error are served but not cached
+        return _store_response(restrooms, cache_key, location_groups, cacheable=used_ai)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching restrooms with AI: {str(e)}")
@@ -22,36 +22,28 @@ def populate_restrooms_database():
     csv_path = "../umass_restrooms_dataset_google.csv"
     df = pd.read_csv(csv_path)
     
-    # Clean and prepare data
-    restrooms_data = []
-    for _, row in df.iterrows():
-        # Skip empty rows
-        if pd.isna(row['building_name']) or row['building_name'].strip() == '':
-            continue
-            
-        restroom_record = {
-            'building_name': str(row['building_name']).strip(),
-            'floor_or_area': str(row['floor_or_area']).strip() if pd.notna(row['floor_or_area']) else None,
-            'address': str(row['address']).strip() if pd.notna(row['address']) else None,
-            'latitude': float(row['latitude']) if pd.notna(row['latitude']) else None,
-            'longitude': float(row['longitude']) if pd.notna(row['longitude']) else None,
-            'rooms': str(row['rooms']).strip() if pd.notna(row['rooms']) else None,
-            'restroom_type': str(row['restroom_type']).strip() if pd.notna(row['restroom_type']) else 'restroom',
-            'multi_user_stalls': float(row['multi_user_stalls']) if pd.notna(row['multi_user_stalls']) else None,
-            'has_shower': bool(row['has_shower']) if pd.notna(row['has_shower']) else False,
-            'staff_only_any': bool(row['staff_only_any']) if pd.notna(row['staff_only_any']) else False,
-            'notes': str(row['notes']).strip() if pd.notna(row['notes']) else None,
-            'place_id': str(row['place_id']).strip() if pd.notna(row['place_id']) else None,
-            'formatted_address_google': str(row['formatted_address_google']).strip() if pd.notna(row['formatted_address_google']) else None,
-            'latitude_google': float(row['latitude_google']) if pd.notna(row['latitude_google']) else None,
-            'longitude_google': float(row['longitude_google']) if pd.notna(row['longitude_google']) else None,
-            'google_maps_url': str(row['google_maps_url']).strip() if pd.notna(row['google_maps_url']) else None,
-            'google_directions_url': str(row['google_directions_url']).strip() if pd.notna(row['google_directions_url']) else None,
-            'geocode_method': str(row['geocode_method']).strip() if pd.notna(row['geocode_method']) else None,
-            'within_campus_bbox': bool(row['within_campus_bbox']) if pd.notna(row['within_campus_bbox']) else True,
-        }
-        
-        restrooms_data.append(restroom_record)
+    # Skip empty rows
+    df = df[df['building_name'].notna() & (df['building_name'].astype(str).str.strip() != '')]
+    
+    # Clean and prepare data column-wise
+    str_columns = [
+        'building_name', 'floor_or_area', 'address', 'rooms', 'restroom_type', 'notes', 'place_id',
+        'formatted_address_google', 'google_maps_url', 'google_directions_url', 'geocode_method',
+    ]
+    float_columns = ['latitude', 'longitude', 'multi_user_stalls', 'latitude_google', 'longitude_google']
+    df = df[str_columns + float_columns + ['has_shower', 'staff_only_any', 'within_campus_bbox']].copy()
+    
+    for col in str_columns:
+        df[col] = df[col].astype(str).str.strip().where(df[col].notna())
+    df[float_columns] = df[float_columns].astype(float)
+    df['restroom_type'] = df['restroom_type'].fillna('restroom')
+    df['has_shower'] = df['has_shower'].astype('boolean').fillna(False).astype(bool)
+    df['staff_only_any'] = df['staff_only_any'].astype('boolean').fillna(False).astype(bool)
+    df['within_campus_bbox'] = df['within_campus_bbox'].astype('boolean').fillna(True).astype(bool)
+    
+    # Normalize NaNs to None so they are sent as nulls
+    df = df.astype(object).where(pd.notna(df), None)
+    restrooms_data = df.to_dict(orient='records')
     
     print(f"Prepared {len(restrooms_data)} restroom records for insertion")
     
@@ -61,7 +53,7 @@ def populate_restrooms_database():
         supabase.table("restrooms").delete().neq('id', 0).execute()
         
         # Insert new data in batches
-        batch_size = 50
+        batch_size = 1000  # Roughly the Supabase payload limit
         for i in range(0, len(restrooms_data), batch_size):
             batch = restrooms_data[i:i + batch_size]
             print(f"Inserting batch {i//batch_size + 1}: records {i+1} to {min(i+batch_size, len(restrooms_data))}")
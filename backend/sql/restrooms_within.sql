@@ -0,0 +1,24 @@
+-- Server-side radius search used by the /search-restrooms endpoints.
+-- Run once in the Supabase SQL editor.
+
+create extension if not exists postgis;
+
+alter table restrooms
+  add column if not exists geog geography(Point, 4326)
+  generated always as (
+    st_setsrid(st_makepoint(longitude_google, latitude_google), 4326)::geography
+  ) stored;
+
+create index if not exists restrooms_geog_idx on restrooms using gist (geog);
+
+create or replace function restrooms_within(lat float8, lng float8, radius_m float8, max_results int default 20)
+returns table (id bigint, distance_m float8)
+language sql stable
+as $$
+  select r.id, st_distance(r.geog, st_setsrid(st_makepoint(lng, lat), 4326)::geography) as distance_m
+  from restrooms r
+  where r.within_campus_bbox
+    and st_dwithin(r.geog, st_setsrid(st_makepoint(lng, lat), 4326)::geography, radius_m)
+  order by r.geog <-> st_setsrid(st_makepoint(lng, lat), 4326)::geography
+  limit max_results;
+$$;
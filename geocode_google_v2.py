@@ -15,10 +15,14 @@ Adds columns:
   - geocode_method                # 'places_findplace' or 'geocode_address'
   - within_campus_bbox            # sanity flag
 """
-import os, time, json, argparse
+import os, time, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, Optional
+import orjson
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 CAMPUS_LAT = 42.3899
@@ -29,10 +33,81 @@ PLACES_FIND_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/
 PLACES_DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
 GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 
+class QuotaExceededError(Exception):
+    """Google kept answering OVER_QUERY_LIMIT / RESOURCE_EXHAUSTED after all retries."""
+
+class RateLimiter:
+    """Leaky bucket shared by worker threads: hands out request slots at most `qps` per second."""
+    def __init__(self, qps: float):
+        self.interval = 1.0 / qps
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
 def backoff_sleep(attempt: int):
     secs = min(60, (2 ** attempt) + (0.1 * attempt))
     time.sleep(secs)
 
+class RateLimitedRetry(Retry):
+    """urllib3 Retry that also takes a rate-limiter slot before each retried request."""
+    def __init__(self, *args, limiter: Optional[RateLimiter] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.limiter = self.limiter
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.limiter:
+            self.limiter.wait()
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that takes a rate-limiter slot before every request it sends."""
+    def __init__(self, limiter: RateLimiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.limiter.wait()
+        return super().send(request, **kwargs)
+
+def make_session(limiter: RateLimiter) -> requests.Session:
+    # Pooled keep-alive connections; urllib3 retries 5xx/429 responses with exponential backoff,
+    # and both first attempts and retries go through the shared rate limiter
+    retry = RateLimitedRetry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], limiter=limiter)
+    adapter = RateLimitedAdapter(limiter, pool_connections=8, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+def get_json(session: requests.Session, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    # Quota errors come back as HTTP 200 with an error status in the body, so urllib3 can't retry them
+    for attempt in range(1, 6):
+        resp = session.get(url, params=params, timeout=20)
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get("status") not in ("OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED"):
+            return data
+        backoff_sleep(attempt)
+    # Raise rather than return the error payload, so callers don't record a false "not found"
+    raise QuotaExceededError(f"{data.get('status')} after {attempt} attempts: {url}")
+
+def save_cache(cache: Dict[str, Any], path: str):
+    # Write to a temp file then rename, so a crash never leaves a truncated cache
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
 def is_within_bbox(lat: float, lng: float) -> bool:
     return (42.375 <= lat <= 42.405) and (-72.545 <= lng <= -72.510)
 
@@ -56,42 +131,20 @@ def find_place(session: requests.Session, api_key: str, query: str) -> Optional[
         "locationbias": f"circle:{CAMPUS_RADIUS_METERS}@{CAMPUS_LAT},{CAMPUS_LNG}",
         "language": "en",
     }
-    attempt = 0
-    while True:
-        resp = session.get(PLACES_FIND_URL, params=params, timeout=20)
-        if resp.status_code >= 500:
-            attempt += 1
-            backoff_sleep(attempt); continue
-        resp.raise_for_status()
-        data = resp.json()
-        status = data.get("status")
-        if status == "OK":
-            cands = data.get("candidates", [])
-            if not cands: return None
-            inside = [c for c in cands if "geometry" in c and "location" in c["geometry"]
-                      and is_within_bbox(c["geometry"]["location"]["lat"], c["geometry"]["location"]["lng"])]
-            return (inside or cands)[0]
-        if status in ("ZERO_RESULTS", "NOT_FOUND"):
-            return None
-        if status in ("OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED"):
-            attempt += 1; backoff_sleep(attempt); continue
-        return None
+    data = get_json(session, PLACES_FIND_URL, params)
+    if data.get("status") == "OK":
+        cands = data.get("candidates", [])
+        if not cands: return None
+        inside = [c for c in cands if "geometry" in c and "location" in c["geometry"]
+                  and is_within_bbox(c["geometry"]["location"]["lat"], c["geometry"]["location"]["lng"])]
+        return (inside or cands)[0]
+    return None
 
 def place_details(session: requests.Session, api_key: str, place_id: str) -> Optional[Dict[str, Any]]:
     params = {"key": api_key, "place_id": place_id, "fields": "url,geometry,formatted_address,name"}
-    attempt = 0
-    while True:
-        resp = session.get(PLACES_DETAILS_URL, params=params, timeout=20)
-        if resp.status_code >= 500:
-            attempt += 1; backoff_sleep(attempt); continue
-        resp.raise_for_status()
-        data = resp.json()
-        status = data.get("status")
-        if status == "OK": return data.get("result", {})
-        if status in ("OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED"):
-            attempt += 1; backoff_sleep(attempt); continue
-        if status in ("ZERO_RESULTS", "NOT_FOUND"): return None
-        return None
+    data = get_json(session, PLACES_DETAILS_URL, params)
+    if data.get("status") == "OK": return data.get("result", {})
+    return None
 
 def geocode_address(session: requests.Session, api_key: str, address: str) -> Optional[Dict[str, Any]]:
     params = {
@@ -101,21 +154,11 @@ def geocode_address(session: requests.Session, api_key: str, address: str) -> Op
         "language": "en",
         "region": "us",
     }
-    attempt = 0
-    while True:
-        resp = session.get(GEOCODE_URL, params=params, timeout=20)
-        if resp.status_code >= 500:
-            attempt += 1; backoff_sleep(attempt); continue
-        resp.raise_for_status()
-        data = resp.json()
-        status = data.get("status")
-        if status == "OK":
-            results = data.get("results", [])
-            return results[0] if results else None
-        if status in ("OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED"):
-            attempt += 1; backoff_sleep(attempt); continue
-        if status in ("ZERO_RESULTS", "NOT_FOUND"): return None
-        return None
+    data = get_json(session, GEOCODE_URL, params)
+    if data.get("status") == "OK":
+        results = data.get("results", [])
+        return results[0] if results else None
+    return None
 
 def best_guess(session: requests.Session, api_key: str, name: str, address: Optional[str]) -> Optional[Dict[str, Any]]:
     queries = [f"{name}, UMass Amherst, Amherst, MA"]
@@ -158,7 +201,13 @@ def main():
     parser.add_argument("--in", dest="in_csv", required=True)
     parser.add_argument("--out", dest="out_csv", required=True)
     parser.add_argument("--cache", dest="cache_path", default="geocode_cache.json")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--qps", type=float, default=10.0, help="max Google API requests per second")
     args = parser.parse_args()
+    if args.qps <= 0:
+        parser.error("--qps must be greater than 0")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     load_dotenv()
     api_key = os.getenv("GOOGLE_MAPS_API_KEY")
@@ -172,12 +221,14 @@ def main():
     cache: Dict[str, Any] = {}
     if os.path.exists(args.cache_path):
         try:
-            cache = json.load(open(args.cache_path))
+            with open(args.cache_path, "rb") as f:
+                cache = orjson.loads(f.read())
         except Exception:
             cache = {}
 
-    session = requests.Session()
+    session = make_session(RateLimiter(qps=args.qps))
     results: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, Optional[str]] = {}
 
     for _, row in by_bldg.iterrows():
         name = str(row["building_name"]).strip()
@@ -185,45 +236,68 @@ def main():
 
         if name in cache:
             results[name] = cache[name]
-            continue
-
-        print(f"Resolving: {name} ...", flush=True)
-        info = best_guess(session, api_key, name, address)
-        if info and isinstance(info.get("lat"), (int, float)) and isinstance(info.get("lng"), (int, float)):
-            info["within_campus_bbox"] = bool(is_within_bbox(info["lat"], info["lng"]))
-            results[name] = info
         else:
-            results[name] = {"error": "not_found"}
-
-        cache[name] = results[name]
-        json.dump(cache, open(args.cache_path, "w"), indent=2)
-        time.sleep(0.25)
-
-    out = df.copy()
-    out["place_id"] = out["building_name"].map(lambda b: results.get(b, {}).get("place_id"))
-    out["formatted_address_google"] = out["building_name"].map(lambda b: results.get(b, {}).get("formatted_address"))
-    out["latitude_google"] = out["building_name"].map(lambda b: results.get(b, {}).get("lat"))
-    out["longitude_google"] = out["building_name"].map(lambda b: results.get(b, {}).get("lng"))
-    out["google_maps_url"] = out["building_name"].map(
-        lambda b: (None if results.get(b, {}).get("error")
-                   else (lambda lat,lng,pid: (None if (lat is None or lng is None) else
-                       ("https://www.google.com/maps/search/?api=1&query=%s,%s%s" % (
-                           lat, lng, f"&query_place_id={pid}" if pid else ""))))(
-                           results.get(b, {}).get("lat"), results.get(b, {}).get("lng"), results.get(b, {}).get("place_id")
-                   )
-        )
-    )
-    out["google_directions_url"] = out["building_name"].map(
-        lambda b: (None if results.get(b, {}).get("error")
-                   else (lambda lat,lng,pid: (None if (lat is None or lng is None) else
-                       ("https://www.google.com/maps/dir/?api=1&destination=%s,%s&travelmode=walking%s" % (
-                           lat, lng, f"&destination_place_id={pid}" if pid else ""))))(
-                           results.get(b, {}).get("lat"), results.get(b, {}).get("lng"), results.get(b, {}).get("place_id")
-                   )
-        )
+            pending[name] = address
+
+    dirty_count = 0
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as ex:
+            futures = {ex.submit(best_guess, session, api_key, name, address): name for name, address in pending.items()}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    info = fut.result()
+                except Exception as e:
+                    # Leave the name uncached so the next run retries it
+                    print(f"Failed: {name}: {e}", file=sys.stderr, flush=True)
+                    continue
+                print(f"Resolved: {name}", flush=True)
+                if info and isinstance(info.get("lat"), (int, float)) and isinstance(info.get("lng"), (int, float)):
+                    info["within_campus_bbox"] = bool(is_within_bbox(info["lat"], info["lng"]))
+                    results[name] = info
+                else:
+                    results[name] = {"error": "not_found"}
+                cache[name] = results[name]
+                dirty_count += 1
+                if dirty_count >= 50:
+                    save_cache(cache, args.cache_path)
+                    dirty_count = 0
+    finally:
+        if dirty_count:
+            save_cache(cache, args.cache_path)
+
+    results_df = pd.DataFrame.from_records(
+        [{
+            "building_name": name,
+            "place_id": info.get("place_id"),
+            "formatted_address_google": info.get("formatted_address"),
+            "latitude_google": info.get("lat"),
+            "longitude_google": info.get("lng"),
+            "geocode_method": info.get("method"),
+            "within_campus_bbox": info.get("within_campus_bbox"),
+        } for name, info in results.items()],
+        columns=["building_name", "place_id", "formatted_address_google", "latitude_google",
+                 "longitude_google", "geocode_method", "within_campus_bbox"],
     )
-    out["geocode_method"] = out["building_name"].map(lambda b: results.get(b, {}).get("method"))
-    out["within_campus_bbox"] = out["building_name"].map(lambda b: results.get(b, {}).get("within_campus_bbox"))
+    added = ["place_id", "formatted_address_google", "latitude_google", "longitude_google",
+             "google_maps_url", "google_directions_url", "geocode_method", "within_campus_bbox"]
+    base = df.drop(columns=[c for c in added if c in df.columns])
+    out = base.merge(results_df, on="building_name", how="left")
+
+    lat = out["latitude_google"].astype(str)
+    lng = out["longitude_google"].astype(str)
+    pid = out["place_id"]
+    has_coords = out["latitude_google"].notna() & out["longitude_google"].notna()
+    out["google_maps_url"] = (
+        "https://www.google.com/maps/search/?api=1&query=" + lat + "," + lng
+        + ("&query_place_id=" + pid.fillna("")).where(pid.notna(), "")
+    ).where(has_coords)
+    out["google_directions_url"] = (
+        "https://www.google.com/maps/dir/?api=1&destination=" + lat + "," + lng + "&travelmode=walking"
+        + ("&destination_place_id=" + pid.fillna("")).where(pid.notna(), "")
+    ).where(has_coords)
+    # Enrichment columns already in the input keep their position; new ones are appended
+    out = out[list(df.columns) + [c for c in added if c not in df.columns]]
 
     out.to_csv(args.out_csv, index=False)
     print(f"Wrote enriched dataset → {args.out_csv}")